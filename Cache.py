@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Filename: 	Cache.py
+# Author: 	Alessandro Gerada, Nada Reza
+# Date: 	2023-04-25
+# Copyright: 	Alessandro Gerada 2023
+# Email: 	alessandro.gerada@liverpool.ac.uk
+
+"""Metadata cache for fetched papers"""
+
+import hashlib
+import json
+import os
+from Paper import Paper
+
+def record_digest(record):
+    """SHA-256 of a cache record as it is stored in the JSON file."""
+    return hashlib.sha256(json.dumps(record, sort_keys=True).encode('utf-8')).hexdigest()
+
+class MetadataCache():
+    """Paper metadata keyed by DOI, persisted as JSON.
+
+    Records hold the Paper constructor arguments (DOI, title, author, year,
+    references) exactly as they came back from Crossref/PubMed, so a cached
+    Paper is identical to a freshly fetched one. With fetch_record the cache
+    fetches and stores misses; without it the cache is offline and misses
+    raise LookupError. Failed fetches are stored as None so a DOI is only
+    tried once per run. start_run() sets a per-run cap on network fetches;
+    once it is spent, misses raise LookupError without being stored. The
+    digest of every record served during a run is kept, so a trace can pin
+    exactly the records its walk read (see pin_records).
+    """
+    def __init__(self, path=None, fetch_record=None):
+        self._path = path
+        self._fetch_record = fetch_record
+        self._records = dict()
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self._records = json.load(f)
+            if fetch_record:
+                # retry DOIs that failed in earlier runs
+                self._records = {doi: record for doi, record in self._records.items() if record is not None}
+        self._dirty = False
+        self._fetch_count = 0
+        self.start_run()
+
+    def __contains__(self, doi):
+        return doi in self._records
+
+    def get_path(self):
+        return self._path
+
+    def is_offline(self):
+        return self._fetch_record is None
+
+    def get_fetch_count(self):
+        """Number of network fetches (cache misses) made through this cache."""
+        return self._fetch_count
+
+    def start_run(self, fetch_budget=None):
+        """Reset the per-run fetch count and cap it at fetch_budget (None for no cap)."""
+        self._fetch_budget = fetch_budget
+        self._run_fetched = set()
+        self._run_fetch_count = 0
+        self._run_records = dict()
+        self._run_refused = False
+
+    def get_fetch_budget(self):
+        return self._fetch_budget
+
+    def get_run_fetch_count(self):
+        return self._run_fetch_count
+
+    def is_budget_spent(self):
+        return self._fetch_budget is not None and self._run_fetch_count >= self._fetch_budget
+
+    def was_fetch_refused(self):
+        """Whether a miss was refused during this run because the budget was spent."""
+        return self._run_refused
+
+    def was_fetched(self, doi):
+        """Whether doi was fetched from the network during this run."""
+        return doi in self._run_fetched
+
+    def get_run_records(self):
+        """{doi: digest} for every record served during this run."""
+        return dict(self._run_records)
+
+    def pin_records(self, digests):
+        """Keep only the records in digests, as returned by get_run_records().
+
+        Raises ValueError if any of them is missing or has changed. Records
+        added since are dropped, so lookups miss exactly as they did when the
+        digests were taken.
+        """
+        changed = sorted(doi for doi, digest in digests.items()
+                         if doi not in self._records or record_digest(self._records[doi]) != digest)
+        if changed:
+            raise ValueError(f"{len(changed)} records in {self._path} are missing or differ from the ones "
+                             f"the trace was recorded with, for example {changed[0]}")
+        self._records = {doi: self._records[doi] for doi in digests}
+
+    def get_record(self, doi):
+        if doi in self._records:
+            record = self._records[doi]
+        elif self.is_offline():
+            raise LookupError(f"{doi} is not in the metadata cache")
+        elif self.is_budget_spent():
+            self._run_refused = True
+            raise LookupError(f"Fetch budget of {self._fetch_budget} spent, not fetching {doi}")
+        else:
+            self._fetch_count += 1
+            self._run_fetch_count += 1
+            self._run_fetched.add(doi)
+            try:
+                record = self._fetch_record(doi)
+            except Exception:
+                record = None
+            self._records[doi] = record
+            self._dirty = True
+        if record is None:
+            raise LookupError(f"Unable to fetch {doi}")
+        if doi not in self._run_records:
+            self._run_records[doi] = record_digest(record)
+        return record
+
+    def get_paper(self, doi):
+        return Paper(**self.get_record(doi))
+
+    def save(self, path=None):
+        path = path or self._path
+        if not path or not self._dirty:
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._records, f)
+        os.replace(tmp_path, path)
+        self._dirty = False
+
+class Resolutions():
+    """Papers resolved during a run, split by whether they cost a network fetch.
+
+    A paper is relevant if it scored above the profile's low-score threshold,
+    in both the walk and the frontier scheduler.
+    """
+    def __init__(self, cache: MetadataCache):
+        self._cache = cache
+        self._relevant = dict()
+
+    def record(self, doi, relevant):
+        self._relevant.setdefault(doi, relevant)
+
+    def report(self):
+        fetched = [doi for doi in self._relevant if self._cache.was_fetched(doi)]
+        cached = [doi for doi in self._relevant if not self._cache.was_fetched(doi)]
+        fetched_relevant = sum(self._relevant[doi] for doi in fetched)
+        cached_relevant = sum(self._relevant[doi] for doi in cached)
+        fetches = self._cache.get_run_fetch_count()
+        per_fetch = f"{fetched_relevant / fetches:.3f}" if fetches else "n/a"
+        print(f"""
+        Resolved {len(self._relevant)} papers, {fetched_relevant + cached_relevant} relevant: 
+        {len(fetched)} fetched from the network ({fetched_relevant} relevant), 
+        {len(cached)} served from the metadata cache ({cached_relevant} relevant), 
+        {fetches} network fetches (budget {self._cache.get_fetch_budget()}), {per_fetch} relevant fetched papers per fetch
+        """)
+        return fetched_relevant, cached_relevant, fetches
@@ -26,7 +26,7 @@ class Paper:
     def add_references(self, references):
         for i in references:
             doi = i['DOI'] if 'DOI' in i else None
-            title = i['article-title'] if 'article-title' in i else None
+            title = [i['article-title']] if 'article-title' in i else None
             author = i['author'] if 'author' in i else None
             year = i['year'] if 'year' in i else None
             ref = Paper(doi, title, author, year)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Filename: 	Profile.py
+# Author: 	Alessandro Gerada, Nada Reza
+# Date: 	2023-04-25
+# Copyright: 	Alessandro Gerada 2023
+# Email: 	alessandro.gerada@liverpool.ac.uk
+
+"""Scoring profiles"""
+
+import csv
+import hashlib
+import json
+from unidecode import unidecode
+
+LOW_SCORE = 10
+MODERATE_SCORE = 20
+EXCELLENT_SCORE = 40
+
+#Back-to-start weight after landing on a paper in each score tier
+LOW_SCORE_WEIGHT = 0.15
+MODERATE_SCORE_WEIGHT = 0.8
+GOOD_SCORE_WEIGHT = 0.15
+EXCELLENT_SCORE_WEIGHT = 0.05
+
+def back_to_start_weight_for_score(score, score_thresholds = (LOW_SCORE, MODERATE_SCORE, EXCELLENT_SCORE)):
+    low_score, moderate_score, excellent_score = score_thresholds
+    if score <= low_score:
+        return LOW_SCORE_WEIGHT
+    elif low_score < score < moderate_score:
+        return MODERATE_SCORE_WEIGHT
+    elif score > excellent_score:
+        return EXCELLENT_SCORE_WEIGHT
+    return GOOD_SCORE_WEIGHT
+
+def load_keywords(path):
+    keywords = []
+    with open(path, 'r') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            keyterm = row['keyterms']
+            value = row['value']
+            keyword = [unidecode(keyterm).lower(), value]
+            keywords.append(keyword)
+    return keywords
+
+def load_important_authors(path):
+    important_authors = []
+    with open(path, 'r') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            author = row['Last']
+            author = unidecode(author)
+            author = author.lower()
+            important_authors.append(author)
+    return important_authors
+
+class Profile():
+    """Keywords, important authors and score tiers for one walk.
+
+    Papers scoring <= low_score are treated as LowScorePaper; papers between
+    low_score and moderate_score, and above excellent_score, change the
+    back-to-start weight.
+    """
+    def __init__(self, name, keywords, important_authors,
+                 low_score = LOW_SCORE, moderate_score = MODERATE_SCORE, excellent_score = EXCELLENT_SCORE):
+        self._name = name
+        self._keywords = keywords
+        self._important_authors = important_authors
+        self._score_thresholds = (float(low_score), float(moderate_score), float(excellent_score))
+
+    def __repr__(self) -> str:
+        return f"Profile {self._name}: {len(self._keywords)} keywords, {len(self._important_authors)} authors, thresholds {self._score_thresholds}"
+
+    @classmethod
+    def from_files(cls, name, keywords_path, important_authors_path, **thresholds):
+        return cls(name, load_keywords(keywords_path), load_important_authors(important_authors_path), **thresholds)
+
+    def get_name(self):
+        return self._name
+
+    def get_keywords(self):
+        return self._keywords
+
+    def get_important_authors(self):
+        return self._important_authors
+
+    def get_score_thresholds(self):
+        return self._score_thresholds
+
+    def get_fingerprint(self):
+        """SHA-256 of the keywords, authors and thresholds, so a replay can check it scores the same way."""
+        content = json.dumps([self._keywords, self._important_authors, self._score_thresholds])
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def load_profiles(path):
+    """Read profiles from a CSV with columns name, keywords, important_authors
+    and optional low_score, moderate_score, excellent_score.
+
+    Names are used in output file names, so they must be unique and must not
+    contain path separators; ValueError is raised otherwise."""
+    profiles = []
+    names = set()
+    with open(path, 'r') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            name = row['name']
+            if not name or name in ('.', '..') or '/' in name or '\\' in name:
+                raise ValueError(f"Profile name {name!r} in {path} cannot be used in a file name")
+            if name in names:
+                raise ValueError(f"Profile {name} appears more than once in {path}")
+            names.add(name)
+            thresholds = {key: float(row[key]) for key in ('low_score', 'moderate_score', 'excellent_score')
+                          if row.get(key)}
+            profiles.append(Profile.from_files(name, row['keywords'], row['important_authors'], **thresholds))
+    return profiles
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Filename: 	Scheduler.py
+# Author: 	Alessandro Gerada, Nada Reza
+# Date: 	2023-04-25
+# Copyright: 	Alessandro Gerada 2023
+# Email: 	alessandro.gerada@liverpool.ac.uk
+
+"""Score-prioritised frontier scheduler
+
+Instead of following references uniformly at random, the scheduler keeps a
+frontier of unresolved DOIs and always resolves the most promising one next.
+Each reference is ranked by the score of the paper that cites it, the score
+of its reference stub (title/author from the citing paper's reference list)
+and its depth from the starting corpus. The tier-based back-to-start policy
+is kept as scheduler state: with probability back_to_start_weight the next
+DOI is taken from the references of the starting papers instead.
+"""
+
+import heapq
+from collections import deque
+from Paper import Paper
+from Surf import SurfWrapper, NewPaper, PreviouslySeenPaper
+from Cache import MetadataCache, Resolutions
+from Profile import LOW_SCORE, MODERATE_SCORE, EXCELLENT_SCORE, back_to_start_weight_for_score
+
+class FrontierEntry():
+    def __init__(self, doi, parent: Paper, reference_index, depth, priority):
+        self._doi = doi
+        self._parent = parent
+        self._reference_index = reference_index
+        self._depth = depth
+        self._priority = priority
+        self._consumed = False
+
+    def __lt__(self, other):
+        # heapq is a min-heap; ties fall back to DOI so runs are reproducible
+        return (-self._priority, self._doi) < (-other._priority, other._doi)
+
+    def get_DOI(self):
+        return self._doi
+
+    def get_parent(self):
+        return self._parent
+
+    def get_reference_index(self):
+        return self._reference_index
+
+    def get_depth(self):
+        return self._depth
+
+    def get_priority(self):
+        return self._priority
+
+    def is_consumed(self):
+        return self._consumed
+
+    def consume(self):
+        self._consumed = True
+
+class FrontierScheduler():
+    """Frontier over DOIs cited by resolved papers.
+
+    The fetch budget is enforced by the MetadataCache (see start_run); once
+    it is spent, entries that are already cached are still resolved and the
+    rest are skipped. Every citing paper keeps its own frontier entry; once
+    a DOI is resolved, the other entries for it come back as
+    PreviouslySeenPaper steps so no citation edge is lost.
+    """
+    def __init__(self, keywords, important_authors, cache: MetadataCache, rng, resolutions: Resolutions = None,
+                 score_thresholds = (LOW_SCORE, MODERATE_SCORE, EXCELLENT_SCORE),
+                 back_to_start_weight = 0.15, parent_weight = 1.0, stub_weight = 1.0, depth_penalty = 5.0):
+        self._keywords = keywords
+        self._important_authors = important_authors
+        self._cache = cache
+        self._rng = rng
+        self._resolutions = resolutions if resolutions is not None else Resolutions(cache)
+        self._score_thresholds = score_thresholds
+        self._back_to_start_weight = back_to_start_weight
+        self._parent_weight = parent_weight
+        self._stub_weight = stub_weight
+        self._depth_penalty = depth_penalty
+
+        self._frontier = []
+        self._start_frontier = []
+        self._resolved = dict()
+        self._attempted = set()
+        self._waiting = dict()
+        self._pending = deque()
+
+    def get_back_to_start_weight(self):
+        return self._back_to_start_weight
+
+    def get_frontier_size(self):
+        return sum(not entry.is_consumed() for entry in self._frontier)
+
+    def add_paper(self, paper: Paper, depth, queue_seen = True):
+        """Mark paper as resolved and queue its references at depth + 1.
+
+        Citations between paper and papers that are already resolved, in
+        either direction, are returned by next_step() as PreviouslySeenPaper
+        steps unless queue_seen is False, as for papers restored from a
+        snapshot whose edges are already known.
+        """
+        self._resolved[paper.get_DOI()] = paper
+        self._attempted.add(paper.get_DOI())
+        for entry in self._waiting.pop(paper.get_DOI(), []):
+            if queue_seen:
+                self._queue_seen(entry)
+            else:
+                entry.consume()
+        score = paper.score_paper(self._keywords, self._important_authors)
+        for index, ref in enumerate(paper.get_references()):
+            doi = ref.get_DOI()
+            if not doi:
+                continue
+            if doi in self._resolved:
+                if not queue_seen:
+                    continue
+                self._pending.append((paper, SurfWrapper(self._resolved[doi], action=PreviouslySeenPaper(),
+                                                         reference_index=index)))
+                continue
+            if doi in self._attempted:
+                continue
+            stub_score = ref.score_paper(self._keywords, self._important_authors)
+            priority = (self._parent_weight * score + self._stub_weight * stub_score
+                        - self._depth_penalty * (depth + 1))
+            entry = FrontierEntry(doi, paper, index, depth + 1, priority)
+            self._waiting.setdefault(doi, []).append(entry)
+            heapq.heappush(self._frontier, entry)
+            if depth == 0:
+                heapq.heappush(self._start_frontier, entry)
+
+    def _queue_seen(self, entry: FrontierEntry):
+        if entry.is_consumed():
+            return
+        entry.consume()
+        self._pending.append((entry.get_parent(), SurfWrapper(self._resolved[entry.get_DOI()],
+                                                              action=PreviouslySeenPaper(),
+                                                              reference_index=entry.get_reference_index())))
+
+    def _pop(self):
+        #Going back to start falls through to the whole frontier once the starting references run out
+        back_to_start = self._rng.random() < self._back_to_start_weight
+        heaps = (self._start_frontier, self._frontier) if back_to_start else (self._frontier,)
+        for heap in heaps:
+            while heap:
+                entry = heapq.heappop(heap)
+                if entry.is_consumed():
+                    continue
+                if entry.get_DOI() in self._resolved:
+                    self._queue_seen(entry)
+                    continue
+                if entry.get_DOI() not in self._attempted:
+                    entry.consume()
+                    return entry
+        return None
+
+    def next_step(self):
+        """Return (parent, SurfWrapper) for the next accepted paper, or None
+        when the frontier is empty.
+
+        Low-scoring papers are resolved but neither returned nor expanded.
+        DOIs the cache cannot serve, including misses once the fetch budget
+        is spent, are skipped.
+        """
+        while True:
+            if self._pending:
+                return self._pending.popleft()
+            entry = self._pop()
+            if entry is None:
+                if self._pending:
+                    continue
+                return None
+            doi = entry.get_DOI()
+            self._attempted.add(doi)
+            try:
+                paper = self._cache.get_paper(doi)
+                score = paper.score_paper(self._keywords, self._important_authors)
+            except LookupError:
+                print(f"Unable to get query for: {doi}")
+                continue
+            self._back_to_start_weight = back_to_start_weight_for_score(score, self._score_thresholds)
+            relevant = score > self._score_thresholds[0]
+            self._resolutions.record(doi, relevant)
+            if not relevant:
+                print(f"Very low paper score: {paper.get_title()}, Total = {score} - not expanding")
+                continue
+            print(f"Paper score: {paper.get_title()}, Total = {score}, priority = {entry.get_priority()}")
+            self.add_paper(paper, entry.get_depth())
+            return (entry.get_parent(), SurfWrapper(paper, action=NewPaper(),
+                                                    reference_index=entry.get_reference_index(),
+                                                    back_to_start_weight=self._back_to_start_weight,
+                                                    fetched_DOI=doi))
+
+    def report(self):
+        self._resolutions.report()
+        print(f"Frontier scheduler: {self.get_frontier_size()} frontier entries left")
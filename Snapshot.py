@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Filename: 	Snapshot.py
+# Author: 	Alessandro Gerada, Nada Reza
+# Date: 	2023-04-25
+# Copyright: 	Alessandro Gerada 2023
+# Email: 	alessandro.gerada@liverpool.ac.uk
+
+"""Memory-mapped citation snapshots
+
+A snapshot stores the result of a crawl so that it can be reopened without
+rebuilding Paper objects or querying Crossref again. The file is laid out as
+
+    magic (8 bytes) | version, header length (2 x uint32) | JSON header |
+    padding | arrays, each aligned to ALIGNMENT bytes
+
+Every resolved paper is a row, and every entry in a resolved paper's
+reference list gets a stub row of its own, so a reloaded reference list has
+the same length, order, duplicates and DOI-less entries as the one written.
+Per-row arrays hold years, scores, visit counts, walk depths and flags;
+references and walk edges are stored in CSR form (offsets + targets); DOIs,
+titles, authors and DAG node colours are kept in string tables (offsets +
+UTF-8 blob). Loading maps the file read-only and wraps each array with
+numpy.frombuffer, so nothing is copied until it is read.
+
+make_dag_from_snapshot rebuilds the walk DAG from a snapshot; it needs
+neither the network nor the fetching code in main.py.
+"""
+
+import json
+import mmap
+import os
+import struct
+import numpy as np
+import networkx as nx
+from Paper import Paper
+
+MAGIC = b'RSSNAP\x00\x00'
+VERSION = 3
+ALIGNMENT = 64
+NO_YEAR = -1
+NO_DEPTH = -1
+DEFAULT_COLOUR = '#ADACAC'
+
+_PREAMBLE = struct.Struct('<II')
+_STRING_FIELDS = ('doi', 'title', 'first_author', 'last_author', 'colour')
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def _string_table(values):
+    encoded = [value.encode('utf-8') if value else b'' for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    offsets[1:] = np.cumsum([len(value) for value in encoded], dtype='<u8')
+    data = np.frombuffer(b''.join(encoded), dtype='u1')
+    return offsets, data
+
+def _csr(rows, count):
+    offsets = np.zeros(count + 1, dtype='<u8')
+    offsets[1:] = np.cumsum([len(row) for row in rows], dtype='<u8')
+    targets = np.fromiter((target for row in rows for target in row), dtype='<u4')
+    return offsets, targets
+
+def _year(year):
+    try:
+        return int(year)
+    except (TypeError, ValueError):
+        return NO_YEAR
+
+def _depth(depth):
+    return NO_DEPTH if depth is None else int(depth)
+
+def write_snapshot(path, papers, keywords, important_authors, starting_papers=(),
+                   paper_counter=None, depth_list=None, walk_edges=(), colours=None):
+    """Write resolved papers, their reference stubs and walk state to path.
+
+    depth_list and colours are keyed by paper name and walk_edges are
+    (child_name, parent_name) pairs, as kept by main(). Scores are computed
+    with the given keywords and important_authors.
+    """
+    paper_counter = paper_counter or {}
+    depth_list = depth_list or {}
+    colours = colours or {}
+    starting_papers = set(starting_papers)
+
+    resolved = list(starting_papers) + [p for p in papers if p not in starting_papers]
+    nodes = list(resolved)
+
+    references = []
+    for paper in resolved:
+        targets = []
+        for ref in paper.get_references():
+            targets.append(len(nodes))
+            nodes.append(ref)
+        references.append(targets)
+    references.extend([] for _ in range(len(nodes) - len(resolved)))
+
+    name_ids = {}
+    for index, paper in enumerate(resolved):
+        name_ids.setdefault(paper.make_name(), index)
+    walk_parents = [[] for _ in nodes]
+    for child_name, parent_name in walk_edges:
+        if child_name in name_ids and parent_name in name_ids:
+            parents = walk_parents[name_ids[child_name]]
+            if name_ids[parent_name] not in parents:
+                parents.append(name_ids[parent_name])
+
+    count = len(nodes)
+    dois = [paper.get_DOI() for paper in nodes]
+    arrays = {
+        'year': np.array([_year(p.get_year()) for p in nodes], dtype='<i4'),
+        'score': np.array([p.score_paper(keywords, important_authors) for p in nodes], dtype='<f8'),
+        'visits': np.array([paper_counter.get(p, 0) for p in resolved] + [0] * (count - len(resolved)), dtype='<u4'),
+        'depth': np.array([_depth(depth_list.get(p.make_name())) for p in resolved] + [NO_DEPTH] * (count - len(resolved)), dtype='<i4'),
+        'is_start': np.array([p in starting_papers for p in resolved] + [False] * (count - len(resolved)), dtype='u1'),
+        'is_resolved': np.array([True] * len(resolved) + [False] * (count - len(resolved)), dtype='u1'),
+        # resolved rows sort ahead of stubs with the same DOI, so find_DOI prefers them
+        'doi_order': np.array(sorted(range(count), key=lambda i: (dois[i] or '', i >= len(resolved))), dtype='<u4'),
+    }
+    arrays['ref_offsets'], arrays['ref_targets'] = _csr(references, count)
+    arrays['walk_offsets'], arrays['walk_targets'] = _csr(walk_parents, count)
+    columns = {
+        'doi': dois,
+        'title': [p.get_title() for p in nodes],
+        'first_author': [p.get_first_author() for p in nodes],
+        'last_author': [p.get_last_author() for p in nodes],
+        'colour': [colours.get(p.make_name()) for p in resolved] + [None] * (count - len(resolved)),
+    }
+    for field in _STRING_FIELDS:
+        arrays[f'{field}_offsets'], arrays[f'{field}_data'] = _string_table(columns[field])
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.str, 'length': len(array), 'offset': offset}
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({'count': count, 'arrays': layout}).encode('utf-8')
+    data_start = _align(len(MAGIC) + _PREAMBLE.size + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_PREAMBLE.pack(VERSION, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+class StringTable():
+    def __init__(self, buffer, offsets):
+        self._buffer = buffer
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        start = int(self._offsets[index])
+        end = int(self._offsets[index + 1])
+        if start == end:
+            return None
+        return self._buffer[start:end].tobytes().decode('utf-8')
+
+class Snapshot():
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except:
+            self._file.close()
+            raise
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a ReferenceSurfer snapshot")
+        version, header_len = _PREAMBLE.unpack_from(self._mmap, len(MAGIC))
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"Unsupported snapshot version {version} in {path}")
+        header_start = len(MAGIC) + _PREAMBLE.size
+        header = json.loads(self._mmap[header_start:header_start + header_len].decode('utf-8'))
+        data_start = _align(header_start + header_len)
+
+        self._count = header['count']
+        self._arrays = {}
+        for name, spec in header['arrays'].items():
+            self._arrays[name] = np.frombuffer(self._mmap, dtype=np.dtype(spec['dtype']),
+                                               count=spec['length'],
+                                               offset=data_start + spec['offset'])
+        self._strings = {}
+        for field in _STRING_FIELDS:
+            self._strings[field] = StringTable(self._arrays[f'{field}_data'],
+                                               self._arrays[f'{field}_offsets'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        # numpy views hold exports of the mmap buffer and must go first. If the
+        # caller still holds arrays, the mapping is released when they are freed.
+        self._arrays = {}
+        self._strings = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+        finally:
+            self._file.close()
+
+    def get_array(self, name):
+        return self._arrays[name]
+
+    def get_DOI(self, index):
+        return self._strings['doi'][index]
+
+    def get_title(self, index):
+        return self._strings['title'][index]
+
+    def get_first_author(self, index):
+        return self._strings['first_author'][index]
+
+    def get_last_author(self, index):
+        return self._strings['last_author'][index]
+
+    def get_colour(self, index):
+        return self._strings['colour'][index]
+
+    def get_year(self, index):
+        year = int(self._arrays['year'][index])
+        return None if year == NO_YEAR else year
+
+    def get_score(self, index):
+        return float(self._arrays['score'][index])
+
+    def get_visits(self, index):
+        return int(self._arrays['visits'][index])
+
+    def get_depth(self, index):
+        depth = int(self._arrays['depth'][index])
+        return None if depth == NO_DEPTH else depth
+
+    def is_start(self, index):
+        return bool(self._arrays['is_start'][index])
+
+    def is_resolved(self, index):
+        return bool(self._arrays['is_resolved'][index])
+
+    def get_reference_ids(self, index):
+        offsets = self._arrays['ref_offsets']
+        return self._arrays['ref_targets'][offsets[index]:offsets[index + 1]]
+
+    def get_walk_parent_ids(self, index):
+        offsets = self._arrays['walk_offsets']
+        return self._arrays['walk_targets'][offsets[index]:offsets[index + 1]]
+
+    def find_DOI(self, doi):
+        """Return the row for doi by binary search over doi_order, or None.
+
+        A resolved paper is returned in preference to reference stubs.
+        """
+        if not doi:
+            return None
+        order = self._arrays['doi_order']
+        low, high = 0, len(order)
+        while low < high:
+            mid = (low + high) // 2
+            if (self.get_DOI(int(order[mid])) or '') < doi:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(order) and self.get_DOI(int(order[low])) == doi:
+            return int(order[low])
+        return None
+
+    def get_paper(self, index):
+        return SnapshotPaper(self, index)
+
+    def get_starting_papers(self):
+        return [self.get_paper(int(i)) for i in np.flatnonzero(self._arrays['is_start'])]
+
+    def get_seen_papers(self):
+        seen = (self._arrays['is_resolved'] == 1) & (self._arrays['is_start'] == 0)
+        return [self.get_paper(int(i)) for i in np.flatnonzero(seen)]
+
+class SnapshotPaper(Paper):
+    """Read-only Paper backed by a Snapshot row.
+
+    Attributes are read from the snapshot on access, so hashing, equality,
+    naming and scoring behave as for the Paper that was written.
+    """
+    def __init__(self, snapshot: Snapshot, index):
+        self._snapshot = snapshot
+        self._index = index
+
+    @property
+    def _DOI(self):
+        return self._snapshot.get_DOI(self._index)
+
+    @property
+    def _title(self):
+        return self._snapshot.get_title(self._index)
+
+    @property
+    def _year(self):
+        return self._snapshot.get_year(self._index)
+
+    @property
+    def _references(self):
+        return self.get_references()
+
+    def get_index(self):
+        return self._index
+
+    def get_first_author(self):
+        return self._snapshot.get_first_author(self._index)
+
+    def get_last_author(self):
+        return self._snapshot.get_last_author(self._index)
+
+    def get_all_authors(self):
+        return []
+
+    def get_references(self):
+        return [SnapshotPaper(self._snapshot, int(i))
+                for i in self._snapshot.get_reference_ids(self._index)]
+
+    def get_colour(self):
+        return self._snapshot.get_colour(self._index)
+
+    def get_visits(self):
+        return self._snapshot.get_visits(self._index)
+
+    def get_depth(self):
+        return self._snapshot.get_depth(self._index)
+
+    def get_stored_score(self):
+        return self._snapshot.get_score(self._index)
+
+    def to_paper(self):
+        """Copy this row and its reference stubs into a plain Paper."""
+        first_author = self.get_first_author()
+        last_author = self.get_last_author()
+        author = None
+        if first_author or last_author:
+            author = [{'family': first_author}, {'family': last_author}]
+        references = []
+        for ref in self.get_references():
+            reference = dict()
+            if ref.get_DOI():
+                reference['DOI'] = ref.get_DOI()
+            if ref.get_title():
+                reference['article-title'] = ref.get_title()
+            if ref.get_year() is not None:
+                reference['year'] = ref.get_year()
+            references.append(reference)
+        title = self.get_title()
+        return Paper(self.get_DOI(), [title] if title else None, author, self.get_year(), references)
+
+def make_dag_from_snapshot(snapshot: Snapshot):
+    """Rebuild the walk DAG drawn by main() from a snapshot, without touching the network."""
+    DAG = nx.MultiDiGraph()
+    names = dict()
+    for paper in snapshot.get_starting_papers() + snapshot.get_seen_papers():
+        name = paper.make_name()
+        names[paper.get_index()] = name
+        depth = paper.get_depth()
+        depth_score = depth * 3 if depth is not None else 0
+        is_start = snapshot.is_start(paper.get_index())
+        DAG.add_node(name,
+                     size=max(paper.get_visits(), 1) + depth_score,
+                     color=paper.get_colour() or DEFAULT_COLOUR,
+                     alpha=0.7 if is_start else 0.9,
+                     line_width=7 if is_start else 2,
+                     DOI=paper.get_DOI(),
+                     title=paper.get_title())
+    for index, name in names.items():
+        for parent in snapshot.get_walk_parent_ids(index):
+            DAG.add_edge(name, names[int(parent)])
+    return DAG
@@ -8,7 +8,11 @@
 
 """Surfing classes"""
 
+from random import Random
 from Paper import Paper
+from Cache import MetadataCache
+from Profile import LOW_SCORE, MODERATE_SCORE, EXCELLENT_SCORE
+from Profile import LOW_SCORE_WEIGHT, MODERATE_SCORE_WEIGHT, GOOD_SCORE_WEIGHT, EXCELLENT_SCORE_WEIGHT
 
 class SurfAction():
     def __init__(self, is_back_to_start: bool): 
@@ -38,12 +42,153 @@ class LowScorePaper(SurfAction):
         super().__init__(is_back_to_start=True)
 
 class SurfWrapper(): 
-    def __init__(self, paper: Paper, action: SurfAction): 
+    def __init__(self, paper: Paper, action: SurfAction, reference_index = None, back_to_start_weight = None, fetched_DOI = None): 
         self._paper = paper
         self._action = action
+        self._reference_index = reference_index
+        self._back_to_start_weight = back_to_start_weight
+        self._fetched_DOI = fetched_DOI
     
     def is_back_to_start(self): 
         return self._action.is_back_to_start()
     
     def get_paper(self): 
-        return self._paper
\ No newline at end of file
+        return self._paper
+
+    def get_action(self): 
+        return self._action
+
+    def get_reference_index(self): 
+        return self._reference_index
+
+    def get_back_to_start_weight(self): 
+        return self._back_to_start_weight
+
+    def get_fetched_DOI(self): 
+        return self._fetched_DOI
+
+def sort_papers(papers):
+    #Sets iterate in hash order, which changes between runs - sort before choosing
+    return sorted(papers, key=lambda paper: paper.get_DOI() or '')
+
+def surf(current_paper, starting_papers, seen_DOIs, seen_papers, keywords, important_authors, cr, cache: MetadataCache,
+         back_to_start_weight=0.15, rng=None, score_thresholds=(LOW_SCORE, MODERATE_SCORE, EXCELLENT_SCORE)):
+    low_score, moderate_score, excellent_score = score_thresholds
+    if rng is None:
+        rng = Random()
+    
+    if seen_papers:
+        papers = seen_papers.union(starting_papers)
+    else:
+        papers = starting_papers
+        
+    if not current_paper.get_references(): 
+        print(f"Current paper does not have references on system: {current_paper.get_title()}")
+        return SurfWrapper(rng.choice(sort_papers(papers)), 
+                           action=InvalidReferences())
+    
+    if rng.random() < back_to_start_weight: 
+        return SurfWrapper(rng.choice(sort_papers(starting_papers)),
+                           action=BackToStart())
+    
+    for _ in range(10): 
+        references = current_paper.get_references()
+        reference_index = rng.randrange(len(references))
+        random_reference = references[reference_index]
+
+        # if we have already seen paper, don't download again
+
+        doi = random_reference.get_DOI()
+        if not doi: 
+            if not random_reference.get_title(): 
+                print("Empty paper title and empty DOI")
+            else:
+                print(f"No DOI for {random_reference.get_title()} found")
+            continue
+        
+        if doi not in seen_DOIs:
+            try: 
+                random_paper = cache.get_paper(doi)
+            except LookupError: 
+                print(f"Unable to get query for: {random_reference.get_title()}")
+                continue
+            try:
+                random_paper_score = random_paper.score_paper(keywords, important_authors)
+
+                if random_paper_score <= low_score:
+                    print(f"""
+                    Very low paper score: {random_paper.get_title()} by {random_paper.get_first_author()}, 
+                    Total ={random_paper_score}, 
+                    Title = {random_paper.title_score(keywords)}, 
+                    Author = {random_paper.author_score(important_authors)} 
+                    - likely irrelevent, surf again
+                    """)
+
+                    back_to_start_weight = LOW_SCORE_WEIGHT
+                    return SurfWrapper(rng.choice(sort_papers(papers)), 
+                           action=LowScorePaper(),
+                           reference_index=reference_index,
+                           back_to_start_weight=back_to_start_weight,
+                           fetched_DOI=doi)
+        
+                elif low_score < random_paper_score < moderate_score:
+                    print(f"""
+                    Moderate paper score: {random_paper.get_title()} by {random_paper.get_first_author()}, 
+                    Total ={random_paper_score}, 
+                    Title = {random_paper.title_score(keywords)}, 
+                    Author = {random_paper.author_score(important_authors)} 
+                    - may be relevant, accept paper but increase BTS 
+                    """)
+                    
+                    back_to_start_weight = MODERATE_SCORE_WEIGHT
+                    return SurfWrapper(random_paper, 
+                                        action=NewPaper(),
+                                        reference_index=reference_index,
+                                        back_to_start_weight=back_to_start_weight,
+                                        fetched_DOI=doi)
+                
+                elif random_paper_score > excellent_score:
+                    print(f"""
+                    Excellent paper score: {random_paper.get_title()} by {random_paper.get_first_author()}, 
+                    Total ={random_paper_score}, 
+                    Title = {random_paper.title_score(keywords)}, 
+                    Author = {random_paper.author_score(important_authors)} 
+                    - highly likely relevant as are subsequent references, reduce BTS
+                    """)
+                    
+                    back_to_start_weight = EXCELLENT_SCORE_WEIGHT
+                    return SurfWrapper(random_paper, 
+                                        action=NewPaper(),
+                                        reference_index=reference_index,
+                                        back_to_start_weight=back_to_start_weight,
+                                        fetched_DOI=doi)
+                
+                else:
+                    print(f"""
+                    Good paper score: {random_paper.get_title()} by {random_paper.get_first_author()}, 
+                    Total ={random_paper_score}, 
+                    Title = {random_paper.title_score(keywords)}, 
+                    Author = {random_paper.author_score(important_authors)} 
+                    - likely relevant, continue
+                    """)
+
+                    back_to_start_weight = GOOD_SCORE_WEIGHT
+                    return SurfWrapper(random_paper, 
+                                        action=NewPaper(),
+                                        reference_index=reference_index,
+                                        back_to_start_weight=back_to_start_weight,
+                                        fetched_DOI=doi)
+
+            except: 
+                print(f"Unable to make paper from query for: {random_reference.get_title()}")
+                continue
+
+        else: 
+            print(f"Paper already seen: {random_reference.get_title()}")
+            random_paper = next(x for x in seen_papers if x.get_DOI() == doi)
+            return SurfWrapper(random_paper, 
+                               action=PreviouslySeenPaper(),
+                               reference_index=reference_index)
+      
+    return SurfWrapper(rng.choice(sort_papers(papers)), 
+                       action=BackToStart())
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Filename: 	Trace.py
+# Author: 	Alessandro Gerada, Nada Reza
+# Date: 	2023-04-25
+# Copyright: 	Alessandro Gerada 2023
+# Email: 	alessandro.gerada@liverpool.ac.uk
+
+"""Walk traces for deterministic replay
+
+A trace is the RNG seed, a JSON header describing the run's inputs and one
+record per surf step:
+
+    magic (8 bytes) | version (uint32) | seed (uint64) |
+    header length (uint32) | JSON header |
+    action (uint8), reference index (int32),
+    DOI length (uint16), fetched DOI length (uint16), DOI, fetched DOI ...
+
+The action is the SurfAction type, the reference index is the position of
+the chosen reference in the current paper's references (-1 if the step did
+not follow a reference), the DOI is the paper the step landed on and the
+fetched DOI is the one resolved through the metadata cache on this step, if
+any (for LowScorePaper it is the rejected paper, not the landing one).
+
+The header records the identity (path and SHA-256) of the snapshot the walk
+resumed from, the metadata cache path with a digest of every record the walk
+read from it, the scoring profile, and whether the run used the frontier
+scheduler and a fetch budget. A replay takes the mode and budget from it and
+refuses to run against a different snapshot or changed records.
+"""
+
+import hashlib
+import json
+import os
+import struct
+from Surf import BackToStart, InvalidReferences, NewPaper, PreviouslySeenPaper, LowScorePaper, SurfWrapper
+
+MAGIC = b'RSTRACE\x00'
+VERSION = 4
+NO_REFERENCE = -1
+MAX_SEED = 2**64 - 1
+
+SURF_ACTIONS = (BackToStart, InvalidReferences, NewPaper, PreviouslySeenPaper, LowScorePaper)
+
+_PREAMBLE = struct.Struct('<IQI')
+_STEP = struct.Struct('<BiHH')
+
+def file_identity(path):
+    """Return {'path', 'sha256'} for the file at path, or None if there is none."""
+    if not path or not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return {'path': str(path), 'sha256': digest.hexdigest()}
+
+def check_replay_input(recorded, path, what):
+    """Return the path to replay from for an input recorded in a trace header.
+
+    recorded is the file_identity stored by the recording run (None if the run
+    had no such input) and path an optional override. Raises ValueError if the
+    file is missing or its contents differ from what was recorded.
+    """
+    if recorded is None:
+        if path:
+            raise ValueError(f"Trace was recorded without a {what}, but {path} was given")
+        return None
+    path = path or recorded['path']
+    identity = file_identity(path)
+    if identity is None or identity['sha256'] != recorded['sha256']:
+        raise ValueError(f"Trace was recorded against {what} {recorded['path']} "
+                         f"(sha256 {recorded['sha256'][:12]}), but {path} "
+                         f"{'is missing' if identity is None else 'has different contents'}")
+    return path
+
+class TraceStep():
+    def __init__(self, action, reference_index, doi, fetched_doi = None):
+        self._action = action
+        self._reference_index = reference_index
+        self._doi = doi
+        self._fetched_doi = fetched_doi
+
+    def __repr__(self) -> str:
+        return f"TraceStep({self._action.__name__}, reference {self._reference_index}, {self._doi}, fetched {self._fetched_doi})"
+
+    def __eq__(self, other):
+        if isinstance(other, TraceStep):
+            return (self._action, self._reference_index, self._doi, self._fetched_doi) == \
+                (other._action, other._reference_index, other._doi, other._fetched_doi)
+        return NotImplemented
+
+    @classmethod
+    def from_wrapper(cls, wrapper: SurfWrapper):
+        reference_index = wrapper.get_reference_index()
+        return cls(type(wrapper.get_action()),
+                   NO_REFERENCE if reference_index is None else reference_index,
+                   wrapper.get_paper().get_DOI(),
+                   wrapper.get_fetched_DOI())
+
+    def get_action(self):
+        return self._action
+
+    def get_reference_index(self):
+        return self._reference_index
+
+    def get_DOI(self):
+        return self._doi
+
+    def get_fetched_DOI(self):
+        return self._fetched_doi
+
+class TraceWriter():
+    """Collects steps and writes the trace on close, once the header is complete."""
+    def __init__(self, path, seed, **header):
+        if not 0 <= seed <= MAX_SEED:
+            raise ValueError(f"Seed {seed} does not fit in a trace; use 0 to {MAX_SEED}")
+        self._path = path
+        self._seed = seed
+        self._header = header
+        self._steps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_path(self):
+        return self._path
+
+    def update_header(self, **fields):
+        self._header.update(fields)
+
+    def write_step(self, step: TraceStep):
+        self._steps.append(step)
+
+    def close(self):
+        header = json.dumps(self._header).encode('utf-8')
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(_PREAMBLE.pack(VERSION, self._seed, len(header)))
+            f.write(header)
+            for step in self._steps:
+                doi = (step.get_DOI() or '').encode('utf-8')
+                fetched_doi = (step.get_fetched_DOI() or '').encode('utf-8')
+                f.write(_STEP.pack(SURF_ACTIONS.index(step.get_action()),
+                                   step.get_reference_index(), len(doi), len(fetched_doi)))
+                f.write(doi)
+                f.write(fetched_doi)
+        os.replace(tmp_path, self._path)
+
+def read_trace(path):
+    """Return (seed, header, steps) for the trace at path."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a ReferenceSurfer trace")
+    version, seed, header_len = _PREAMBLE.unpack_from(data, len(MAGIC))
+    if version != VERSION:
+        raise ValueError(f"Unsupported trace version {version} in {path}; it was recorded by an older walk and cannot be replayed")
+    offset = len(MAGIC) + _PREAMBLE.size
+    header = json.loads(data[offset:offset + header_len].decode('utf-8'))
+    offset += header_len
+    steps = []
+    while offset < len(data):
+        action, reference_index, doi_len, fetched_len = _STEP.unpack_from(data, offset)
+        offset += _STEP.size
+        doi = data[offset:offset + doi_len].decode('utf-8') or None
+        offset += doi_len
+        fetched_doi = data[offset:offset + fetched_len].decode('utf-8') or None
+        offset += fetched_len
+        steps.append(TraceStep(SURF_ACTIONS[action], reference_index, doi, fetched_doi))
+    return seed, header, steps
@@ -15,11 +15,19 @@ import urllib.request
 from urllib.error import HTTPError
 import csv
 from datetime import datetime
-from random import random, choice
+from random import Random
+import argparse
 from anytree import Node, RenderTree
 from unidecode import unidecode
-from Surf import SurfWrapper, BackToStart, InvalidReferences, NewPaper, PreviouslySeenPaper, LowScorePaper
+from Surf import SurfWrapper, BackToStart, InvalidReferences, NewPaper, PreviouslySeenPaper, LowScorePaper, sort_papers, surf
 from Paper import Paper, DAGNode
+from Snapshot import Snapshot, write_snapshot
+from Cache import MetadataCache, Resolutions
+from Trace import TraceWriter, TraceStep, read_trace, file_identity, check_replay_input, MAX_SEED
+from Profile import Profile, load_keywords, load_important_authors, load_profiles, GOOD_SCORE_WEIGHT
+from Scheduler import FrontierScheduler
+import os
+import shutil
 import numpy as np
 import matplotlib.pyplot as plt
 import networkx as nx 
@@ -34,27 +42,15 @@ fetch = PubMedFetcher()
 
 KEYWORDS = 'keywords.csv'
 IMPORTANT_AUTHORS = 'important_authors.csv'
+SNAPSHOT_PATH = 'snapshot.rss'
+METADATA_CACHE_PATH = 'metadata_cache.json'
+TRACE_PATH = 'trace.rst'
+OUTPUT_PATH = 'output.csv'
 
-keywords = [] 
-important_authors = [] 
+keywords = load_keywords(KEYWORDS)
+important_authors = load_important_authors(IMPORTANT_AUTHORS)
 
-with open(KEYWORDS, 'r') as csvfile:
-    reader = csv.DictReader(csvfile)
-    for row in reader:
-        keyterm = row['keyterms']
-        value = row['value']
-        keyword = [unidecode(keyterm).lower(), value]
-        keywords.append(keyword)
-    
-with open(IMPORTANT_AUTHORS, 'r') as csvfile:
-    reader = csv.DictReader(csvfile)
-    for row in reader:
-        author = row['Last']
-        author = unidecode(author)
-        author = author.lower()
-        important_authors.append(author)
-
-def make_paper_from_query(query):
+def record_from_query(query):
     message = query['message']
     doi = message['DOI']
     if '.org/' in doi:
@@ -80,11 +76,14 @@ def make_paper_from_query(query):
     else: 
         year = datetime.fromisoformat(date_time).year
     references = message['reference'] if message['references-count'] > 0 else None
-    return Paper(DOI=doi,
-                 title=title,
-                 author=author,
-                 year=year,
-                 references=references)
+    return dict(DOI=doi,
+                title=title,
+                author=author,
+                year=year,
+                references=references)
+
+def make_paper_from_query(query):
+    return Paper(**record_from_query(query))
 
 def query_from_DOI(doi): 
     cr = Crossref()
@@ -101,6 +100,14 @@ def query_from_DOI(doi):
     print(f"Unable to pull {doi}")
     return None
 
+def record_from_DOI(doi):
+    return record_from_query(query_from_DOI(doi))
+
+def trace_snapshot_path(trace_path):
+    #A resumed walk's trace refers to a copy of its input snapshot named after the trace
+    root, _ = os.path.splitext(trace_path)
+    return f"{root}.snapshot.rss"
+
 def make_dagnode_from_paper(paper_name, score : float = None, depth : float = None):
     dagnode = DAGNode(paper_name, score, depth)
     return(dagnode)
@@ -109,112 +116,55 @@ def get_dagnode(paper: Paper):
     id = paper.make_name()
     return(tuple(id, ))
 
-def surf(current_paper, starting_papers, seen_DOIs, seen_papers, keywords, important_authors, cr, back_to_start_weight=0.15):
-    
-    if seen_papers:
-        papers = seen_papers.union(starting_papers)
-    else:
-        papers = starting_papers
-        
-    if not current_paper.get_references(): 
-        print(f"Current paper does not have references on system: {current_paper.get_title()}")
-        return SurfWrapper(choice(list(papers)), 
-                           action=InvalidReferences())
-    
-    if random() < back_to_start_weight: 
-        return SurfWrapper(choice(list(starting_papers)),
-                           action=BackToStart())
-    
-    for _ in range(10): 
-        random_reference = choice(current_paper.get_references())
-
-        # if we have already seen paper, don't download again
-
-        doi = random_reference.get_DOI()
-        if not doi: 
-            if not random_reference.get_title(): 
-                print("Empty paper title and empty DOI")
-            else:
-                print(f"No DOI for {random_reference.get_title()} found")
-            continue
-        
-        if doi not in seen_DOIs:
-            try: 
-                query = query_from_DOI(doi)
-            except: 
-                print(f"Unable to get query for: {random_reference.get_title()}")
-                continue
-            try:
-                random_paper = make_paper_from_query(query)
-                random_paper_score = random_paper.score_paper(keywords, important_authors)
-
-                if random_paper_score <= 10:
-                    print(f"""
-                    Very low paper score: {random_paper.get_title()} by {random_paper.get_first_author()}, 
-                    Total ={random_paper_score}, 
-                    Title = {random_paper.title_score(keywords)}, 
-                    Author = {random_paper.author_score(important_authors)} 
-                    - likely irrelevent, surf again
-                    """)
-
-                    back_to_start_weight = 0.15
-                    return SurfWrapper(choice(list(papers)), 
-                           action=LowScorePaper())
-        
-                elif 10 < random_paper_score < 20:
-                    print(f"""
-                    Moderate paper score: {random_paper.get_title()} by {random_paper.get_first_author()}, 
-                    Total ={random_paper_score}, 
-                    Title = {random_paper.title_score(keywords)}, 
-                    Author = {random_paper.author_score(important_authors)} 
-                    - may be relevant, accept paper but increase BTS 
-                    """)
-                    
-                    back_to_start_weight = 0.8
-                    return SurfWrapper(random_paper, 
-                                        action=NewPaper())
-                
-                elif random_paper_score > 40:
-                    print(f"""
-                    Excellent paper score: {random_paper.get_title()} by {random_paper.get_first_author()}, 
-                    Total ={random_paper_score}, 
-                    Title = {random_paper.title_score(keywords)}, 
-                    Author = {random_paper.author_score(important_authors)} 
-                    - highly likely relevant as are subsequent references, reduce BTS
-                    """)
-                    
-                    back_to_start_weight = 0.05
-                    return SurfWrapper(random_paper, 
-                                        action=NewPaper())
-                
-                else:
-                    print(f"""
-                    Good paper score: {random_paper.get_title()} by {random_paper.get_first_author()}, 
-                    Total ={random_paper_score}, 
-                    Title = {random_paper.title_score(keywords)}, 
-                    Author = {random_paper.author_score(important_authors)} 
-                    - likely relevant, continue
-                    """)
-
-                    back_to_start_weight = 0.15
-                    return SurfWrapper(random_paper, 
-                                        action=NewPaper())
-
-            except: 
-                print(f"Unable to make paper from query for: {random_reference.get_title()}")
-                continue
+def default_profile():
+    return Profile('default', keywords, important_authors)
 
-        else: 
-            print(f"Paper already seen: {random_reference.get_title()}")
-            random_paper = next(x for x in seen_papers if x.get_DOI() == doi)
-            return SurfWrapper(random_paper, 
-                               action=PreviouslySeenPaper())
-      
-    return SurfWrapper(choice(list(papers)), 
-                       action=BackToStart())
-
-def main(): 
+def main(snapshot_path=SNAPSHOT_PATH, resume_path=None, cache_path=None, trace_path=None, replay_path=None, seed=None, iterations=1000,
+         profile=None, cache=None, output_path=OUTPUT_PATH, figure_path=None, show_plot=True,
+         scheduler=False, fetch_budget=None, trace=None): 
     cr = Crossref()
+
+    #Each profile gets its own copy of the author list - starting authors are added to it below
+    if profile is None:
+        profile = default_profile()
+    print(f"{profile}")
+    keywords = profile.get_keywords()
+    important_authors = list(profile.get_important_authors())
+    score_thresholds = profile.get_score_thresholds()
+
+    #Replays re-run a recorded walk from cached metadata only, never the network.
+    #A cache passed in is shared with other runs and saved by whoever made it
+    owns_cache = cache is None
+    replay_steps = None
+    if replay_path:
+        seed, trace_header, replay_steps = read_trace(replay_path)
+        iterations = len(replay_steps)
+        scheduler = trace_header['scheduler']
+        fetch_budget = trace_header['fetch_budget']
+        if trace_header.get('profile_fingerprint') != profile.get_fingerprint(): 
+            raise ValueError(f"{replay_path} was recorded with profile {trace_header.get('profile')}, "
+                             f"which scores differently from profile {profile.get_name()}")
+        resume_path = check_replay_input(trace_header.get('snapshot'), resume_path, 'snapshot')
+        recorded_cache = trace_header['metadata_cache']
+        cache = MetadataCache(cache_path or recorded_cache['path'])
+        cache.pin_records(recorded_cache['records'])
+        trace_path = None
+    else:
+        if owns_cache:
+            cache = MetadataCache(cache_path, fetch_record=record_from_DOI)
+        if seed is None:
+            seed = Random().getrandbits(63)
+    print(f"Random seed: {seed}")
+    rng = Random(seed)
+    owns_trace = trace is None
+    if owns_trace and trace_path: 
+        trace = TraceWriter(trace_path, seed)
+    if trace: 
+        trace.update_header(profile=profile.get_name(), profile_fingerprint=profile.get_fingerprint(),
+                            scheduler=scheduler, fetch_budget=fetch_budget)
+    #The budget covers every network fetch in this run, starting corpus included
+    cache.start_run(fetch_budget)
+    divergences = 0
     STARTING_CORPUS_PATH = 'corpus.csv'
 
     starting_DOIs = set()
@@ -252,10 +202,28 @@ def main():
             abx_classes[abx] = abxclass
             abx_list.append(abx)
 
+    #Resume a previous crawl if asked to, otherwise pull the starting corpus
+    snapshot = None
+    input_snapshot = None
+    if resume_path:
+        input_snapshot = file_identity(resume_path)
+        snapshot = Snapshot(resume_path)
+        #The trace refers to a copy of this snapshot, written next to it at the end of the run
+        if trace: 
+            trace.update_header(snapshot=dict(input_snapshot, path=trace_snapshot_path(trace.get_path())))
+        corpus = [paper.to_paper() for paper in snapshot.get_starting_papers()]
+    else:
+        corpus = []
+        for i in sorted(starting_DOIs): 
+            try: 
+                corpus.append(cache.get_paper(i))
+            except LookupError as e: 
+                print(f"Unable to pull starting paper: {e}")
+        if not corpus: 
+            raise ValueError("None of the starting corpus could be fetched")
+
     #Add starting corpus as papers, DAG nodes (of depth 0) and calculate scores
-    for i in starting_DOIs:
-        result = query_from_DOI(i)
-        paper = make_paper_from_query(result)
+    for paper in corpus:
         starting_papers.add(paper)
         paper_name = paper.make_name()
         dag_node = make_dagnode_from_paper(paper_name)
@@ -289,12 +257,73 @@ def main():
         except:
             pass
 
+    #Restore papers, visit counts, depths and walk edges from the snapshot, then close it
+    if snapshot is not None:
+        for snapshot_paper in snapshot.get_seen_papers():
+            paper = snapshot_paper.to_paper()
+            paper_name = paper.make_name()
+            seen_papers.add(paper)
+            seen_DOIs.add(paper.get_DOI())
+            paper_counter[paper] = snapshot_paper.get_visits()
+            dag_node = make_dagnode_from_paper(paper_name)
+            node_list.add(dag_node)
+            if snapshot_paper.get_depth() is not None:
+                depth_list[paper_name] = snapshot_paper.get_depth()
+            title = unidecode(paper.get_title() or '').lower()
+            node_colours[paper_name] = [abx_colours[ab] for ab in abx_list if ab in title]
+        for paper in snapshot.get_starting_papers() + snapshot.get_seen_papers():
+            paper_name = paper.make_name()
+            for parent in snapshot.get_walk_parent_ids(paper.get_index()):
+                parent_name = snapshot.get_paper(int(parent)).make_name()
+                paired_node_list.setdefault(paper_name, []).append((paper_name, parent_name))
+        snapshot.close()
+
+    #The scheduler resolves the highest priority DOI on its frontier instead of a random reference
+    resolutions = Resolutions(cache)
+    frontier = None
+    if scheduler:
+        frontier = FrontierScheduler(keywords, important_authors, cache, rng, 
+                                     resolutions=resolutions, 
+                                     score_thresholds=score_thresholds)
+        #Citations between restored papers are already walk edges in the snapshot
+        for paper in sort_papers(starting_papers):
+            frontier.add_paper(paper, 0, queue_seen=not resume_path)
+        for paper in sort_papers(seen_papers):
+            if paper.make_name() in depth_list:
+                frontier.add_paper(paper, depth_list[paper.make_name()], queue_seen=False)
+
     #Start surfing
-    paper_pointer = choice(list(starting_papers))
-    for _ in range(1000): 
+    back_to_start_weight = GOOD_SCORE_WEIGHT
+    paper_pointer = rng.choice(sort_papers(starting_papers))
+    for _ in range(iterations): 
+        #Cached DOIs are free, so the walk only stops once it needs a fetch the budget no longer allows
+        if not frontier and cache.was_fetch_refused(): 
+            print(f"Fetch budget of {fetch_budget} spent after {_} iterations")
+            break
         print(f"iteration {_}")
-        new_wrapped_paper = surf(paper_pointer, starting_papers, seen_DOIs, seen_papers, keywords, important_authors, cr=cr,
-                                 back_to_start_weight=0.15)
+        if frontier: 
+            next_step = frontier.next_step()
+            if next_step is None: 
+                print(f"No frontier entries left that can be resolved after {_} iterations")
+                break
+            paper_pointer, new_wrapped_paper = next_step
+        else: 
+            new_wrapped_paper = surf(paper_pointer, starting_papers, seen_DOIs, seen_papers, keywords, important_authors, cr=cr,
+                                     cache=cache, back_to_start_weight=back_to_start_weight, rng=rng, 
+                                     score_thresholds=score_thresholds)
+            #Score tiers change the restart probability for the rest of the walk
+            if new_wrapped_paper.get_back_to_start_weight() is not None: 
+                back_to_start_weight = new_wrapped_paper.get_back_to_start_weight()
+            #NewPaper is only returned for papers scoring above the low threshold
+            if new_wrapped_paper.get_fetched_DOI(): 
+                resolutions.record(new_wrapped_paper.get_fetched_DOI(), 
+                                   isinstance(new_wrapped_paper.get_action(), NewPaper))
+        step = TraceStep.from_wrapper(new_wrapped_paper)
+        if trace: 
+            trace.write_step(step)
+        if replay_path and step != replay_steps[_]: 
+            print(f"Replay diverged at iteration {_}: recorded {replay_steps[_]}, got {step}")
+            divergences += 1
         new_paper = new_wrapped_paper.get_paper()
         #new_paper_score = new_paper.score_paper(keywords, important_authors)
         new_paper_name = new_paper.make_name()
@@ -343,12 +372,34 @@ def main():
             else: 
                 paper_counter[new_paper] += 1
      
+        if frontier: 
+            continue
         if new_paper.get_references(): 
             paper_pointer = new_paper
         elif seen_papers: 
-            paper_pointer = choice(list(seen_papers))
+            paper_pointer = rng.choice(sort_papers(seen_papers))
         else: 
-            paper_pointer = choice(list(starting_papers))
+            paper_pointer = rng.choice(sort_papers(starting_papers))
+
+    if owns_cache: 
+        cache.save()
+    #Pin the records this walk read and the snapshot it resumed from, so the trace replays after later runs
+    if trace: 
+        trace.update_header(metadata_cache=dict(path=cache.get_path(), records=cache.get_run_records()))
+        archive_path = trace_snapshot_path(trace.get_path())
+        if input_snapshot: 
+            if os.path.abspath(resume_path) != os.path.abspath(archive_path): 
+                shutil.copyfile(resume_path, archive_path)
+        elif os.path.exists(archive_path): 
+            os.remove(archive_path)
+    if trace and owns_trace: 
+        trace.close()
+    if frontier: 
+        frontier.report()
+    else: 
+        resolutions.report()
+    if replay_path: 
+        print(f"Replayed {iterations} steps from {replay_path} with {divergences} divergences")
 
     #Print our list of papers and how many times we have seen them, in order of frequency   
     sorted_paper_counter = sorted(paper_counter.items(), key=lambda item: item[1], reverse=True)
@@ -416,6 +467,17 @@ def main():
         if paper_name not in colour_list.keys():
             colour_list[paper_name] = '#ADACAC'
 
+    #Save the crawl so it can be reopened without re-fetching
+    if snapshot_path and not replay_path:
+        walk_edges = [pair for pairs in paired_node_list.values() for pair in pairs]
+        papers = starting_papers.union(seen_papers)
+        write_snapshot(snapshot_path, papers, keywords, important_authors,
+                       starting_papers=starting_papers,
+                       paper_counter=paper_counter,
+                       depth_list=depth_list,
+                       walk_edges=walk_edges,
+                       colours=colour_list)
+
     #Make starting papers look different
     alpha_list = dict()
     line_width_list = {}
@@ -487,7 +549,7 @@ def main():
                             font_size=6, font_weight='bold', font_family='sans-serif', 
                             horizontalalignment = 'center', verticalalignment = 'center')
 
-    with open('output.csv', 'w', newline='') as csvfile:
+    with open(output_path, 'w', newline='') as csvfile:
         writer = csv.writer(csvfile, delimiter=",")
         writer.writerow(['DOI', 'author', 'title', 'times_seen'])
         for paper,times_seen in paper_counter.items(): 
@@ -496,6 +558,92 @@ def main():
                              paper.get_first_author(),
                              times_seen])
     
-    plt.show()
-
-main()
+    if figure_path:
+        plt.savefig(figure_path)
+    if show_plot:
+        plt.show()
+    plt.close()
+
+def batch(profiles, seed=None, iterations=1000, scheduler=False, fetch_budget=None):
+    """Run one walk per profile, resolving each DOI once across all of them.
+
+    Profiles share a metadata cache, so later walks reuse papers fetched by
+    earlier ones. Each walk keeps its own counters and thresholds and writes
+    output_<name>.csv, dag_<name>.png, snapshot_<name>.rss and trace_<name>.rst.
+    The cache is saved once at the end, before the traces are written.
+    """
+    cache = MetadataCache(METADATA_CACHE_PATH, fetch_record=record_from_DOI)
+    traces = []
+    for profile in profiles:
+        name = profile.get_name()
+        profile_seed = seed if seed is not None else Random().getrandbits(63)
+        trace = TraceWriter(f"trace_{name}.rst", profile_seed)
+        traces.append(trace)
+        main(snapshot_path=f"snapshot_{name}.rss",
+             trace=trace,
+             seed=profile_seed,
+             iterations=iterations,
+             profile=profile,
+             cache=cache,
+             output_path=f"output_{name}.csv",
+             figure_path=f"dag_{name}.png",
+             show_plot=False,
+             scheduler=scheduler,
+             fetch_budget=fetch_budget)
+    cache.save()
+    for trace in traces:
+        trace.close()
+
+def seed_type(value):
+    #Traces store the seed as an unsigned 64-bit integer
+    seed = int(value)
+    if not 0 <= seed <= MAX_SEED:
+        raise argparse.ArgumentTypeError(f"seed must be between 0 and {MAX_SEED}")
+    return seed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seed', type=seed_type, help="seed for the walk RNG (random if omitted)")
+    parser.add_argument('--trace', help=f"where to record the walk trace (default {TRACE_PATH})")
+    parser.add_argument('--replay', help="replay a recorded trace offline from the metadata cache")
+    parser.add_argument('--profiles', help="CSV of scoring profiles to run as a batch over one shared fetch pass, "
+                                           "or to pick the profile of a --replay trace from")
+    parser.add_argument('--scheduler', action='store_true', help="resolve DOIs from a score-prioritised frontier instead of a random walk")
+    parser.add_argument('--fetch-budget', type=int, help="maximum number of network fetches per run")
+    parser.add_argument('--snapshot', help=f"resume the walk from this snapshot instead of the starting corpus; "
+                                           f"every run writes {SNAPSHOT_PATH} (a replay must use the snapshot its trace was recorded from)")
+    args = parser.parse_args()
+    if args.replay and (args.trace or args.seed is not None): 
+        parser.error("--replay takes its seed from the trace and records nothing; drop --trace and --seed")
+    if args.profiles and not args.replay and (args.trace or args.snapshot): 
+        parser.error("--profiles writes trace_<name>.rst and snapshot_<name>.rss per profile; drop --trace and --snapshot")
+
+    profile = None
+    if args.replay: 
+        _, trace_header, _ = read_trace(args.replay)
+        name = trace_header.get('profile', 'default')
+        if args.profiles: 
+            profiles = {p.get_name(): p for p in load_profiles(args.profiles)}
+            if name not in profiles: 
+                parser.error(f"{args.replay} was recorded with profile {name}, which is not in {args.profiles}")
+            profile = profiles[name]
+        elif name != 'default': 
+            parser.error(f"{args.replay} was recorded with profile {name}; pass the --profiles file it came from")
+        if args.scheduler and not trace_header['scheduler']: 
+            parser.error(f"{args.replay} was recorded by the random walk, not --scheduler")
+        if args.fetch_budget is not None and args.fetch_budget != trace_header['fetch_budget']: 
+            parser.error(f"{args.replay} was recorded with a fetch budget of {trace_header['fetch_budget']}")
+    elif args.profiles: 
+        batch(load_profiles(args.profiles), seed=args.seed, scheduler=args.scheduler, fetch_budget=args.fetch_budget)
+        raise SystemExit
+    else: 
+        if args.trace is None: 
+            args.trace = TRACE_PATH
+    main(resume_path=args.snapshot, 
+         cache_path=METADATA_CACHE_PATH, 
+         profile=profile, 
+         trace_path=args.trace, 
+         replay_path=args.replay, 
+         seed=args.seed, 
+         scheduler=args.scheduler, 
+         fetch_budget=args.fetch_budget)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Filename: 	test_profile.py
+# Author: 	Alessandro Gerada, Nada Reza
+# Date: 	2023-04-25
+# Copyright: 	Alessandro Gerada 2023
+# Email: 	alessandro.gerada@liverpool.ac.uk
+
+"""Tests for scoring profiles and batches over a shared metadata cache"""
+
+from random import Random
+import pytest
+from Paper import Paper
+from Cache import MetadataCache, Resolutions
+from Profile import Profile, load_profiles, LOW_SCORE, MODERATE_SCORE, EXCELLENT_SCORE
+from Scheduler import FrontierScheduler
+from Surf import NewPaper
+
+RECORDS = {
+    'A': dict(DOI='A', title=['Pharmacokinetic A'], author=None, year=2000, references=[{'DOI': 'B'}]),
+    'B': dict(DOI='B', title=['Pharmacokinetic B'], author=None, year=2001, references=None),
+}
+
+def write_profiles(tmp_path, rows):
+    (tmp_path / 'keywords.csv').write_text('keyterms,value\nPharmacokinetic,3\n')
+    (tmp_path / 'authors.csv').write_text('Last\nRoberts\n')
+    path = tmp_path / 'profiles.csv'
+    lines = ['name,keywords,important_authors,low_score,moderate_score,excellent_score']
+    lines += [f"{name},{tmp_path / 'keywords.csv'},{tmp_path / 'authors.csv'},{thresholds}" for name, thresholds in rows]
+    path.write_text('\n'.join(lines) + '\n')
+    return path
+
+def test_load_profiles(tmp_path):
+    path = write_profiles(tmp_path, [('strict', '50,60,70'), ('default', ',,')])
+    strict, default = load_profiles(path)
+    assert strict.get_name() == 'strict' and strict.get_score_thresholds() == (50, 60, 70)
+    assert default.get_score_thresholds() == (LOW_SCORE, MODERATE_SCORE, EXCELLENT_SCORE)
+    assert default.get_keywords() == [['pharmacokinetic', '3']]
+    assert default.get_important_authors() == ['roberts']
+
+@pytest.mark.parametrize('rows', [
+    [('same', ',,'), ('same', '1,2,3')],
+    [('../escape', ',,')],
+    [('sub\\dir', ',,')],
+    [('', ',,')],
+])
+def test_load_profiles_rejects_unusable_names(tmp_path, rows):
+    with pytest.raises(ValueError):
+        load_profiles(write_profiles(tmp_path, rows))
+
+def test_fingerprint():
+    profile = Profile('a', [['pharmacokinetic', '3']], ['roberts'])
+    assert profile.get_fingerprint() == Profile('b', [['pharmacokinetic', '3']], ['roberts']).get_fingerprint()
+    assert profile.get_fingerprint() != Profile('a', [['pharmacokinetic', '4']], ['roberts']).get_fingerprint()
+    assert profile.get_fingerprint() != Profile('a', [['pharmacokinetic', '3']], []).get_fingerprint()
+    assert profile.get_fingerprint() != Profile('a', [['pharmacokinetic', '3']], ['roberts'], low_score=5).get_fingerprint()
+
+def test_profiles_share_one_fetch_pass():
+    fetched = []
+    def fetch_record(doi):
+        fetched.append(doi)
+        return RECORDS[doi]
+    cache = MetadataCache(fetch_record=fetch_record)
+    keywords = [['pharmacokinetic', '3']]
+    profiles = [Profile('lenient', keywords, [], low_score=5, moderate_score=6), Profile('strict', keywords, [], low_score=50)]
+    runs = dict()
+    for profile in profiles:
+        cache.start_run()
+        resolutions = Resolutions(cache)
+        frontier = FrontierScheduler(profile.get_keywords(), profile.get_important_authors(), cache, Random(0),
+                                     resolutions=resolutions, score_thresholds=profile.get_score_thresholds())
+        frontier.add_paper(Paper('S', ['Start'], None, 1999, [{'DOI': 'A'}]), 0)
+        steps = []
+        while (step := frontier.next_step()):
+            steps.append(step)
+        runs[profile.get_name()] = steps, resolutions.report()
+
+    assert fetched == ['A', 'B']
+    lenient_steps, lenient_report = runs['lenient']
+    strict_steps, strict_report = runs['strict']
+    assert [type(wrapper.get_action()) for _, wrapper in lenient_steps] == [NewPaper, NewPaper]
+    assert lenient_report == (2, 0, 2)
+    # the strict profile rejects A from the cache, costing no fetches
+    assert strict_steps == []
+    assert strict_report == (0, 0, 0)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Filename: 	test_scheduler.py
+# Author: 	Alessandro Gerada, Nada Reza
+# Date: 	2023-04-25
+# Copyright: 	Alessandro Gerada 2023
+# Email: 	alessandro.gerada@liverpool.ac.uk
+
+"""Tests for the frontier scheduler and the fetch budget"""
+
+from random import Random
+import pytest
+from Paper import Paper
+from Cache import MetadataCache
+from Scheduler import FrontierScheduler
+from Surf import NewPaper, PreviouslySeenPaper
+
+KEYWORDS = [['pharmacokinetic', '3']]
+RECORDS = {
+    'A': dict(DOI='A', title=['Pharmacokinetic A'], author=None, year=2000, references=[{'DOI': 'X'}]),
+    'X': dict(DOI='X', title=['Pharmacokinetic X'], author=None, year=2001, references=None),
+}
+
+def test_every_citation_is_returned():
+    cache = MetadataCache(fetch_record=lambda doi: RECORDS[doi])
+    start = Paper('S', ['Start'], None, 1999, [{'DOI': 'A'}, {'DOI': 'X'}])
+    frontier = FrontierScheduler(KEYWORDS, [], cache, Random(0), score_thresholds=(1, 20, 40))
+    frontier.add_paper(start, 0)
+    edges = set()
+    while (step := frontier.next_step()):
+        parent, wrapper = step
+        edges.add((parent.get_DOI(), wrapper.get_paper().get_DOI(), type(wrapper.get_action())))
+    assert {(p, c) for p, c, _ in edges} == {('S', 'A'), ('S', 'X'), ('A', 'X')}
+    assert sum(action is PreviouslySeenPaper for _, _, action in edges) == 1
+    assert sum(action is NewPaper for _, _, action in edges) == 2
+
+def test_fetch_budget_is_a_hard_cap():
+    fetched = []
+    def fetch_record(doi):
+        fetched.append(doi)
+        raise LookupError(doi)
+    cache = MetadataCache(fetch_record=fetch_record)
+    cache.start_run(2)
+    for doi in 'abcde':
+        with pytest.raises(LookupError):
+            cache.get_paper(doi)
+    assert fetched == ['a', 'b']
+    assert cache.is_budget_spent() and cache.get_run_fetch_count() == 2
+    cache.start_run(None)
+    assert not cache.is_budget_spent()
+
+def test_restored_citations_are_not_returned():
+    cache = MetadataCache(fetch_record=lambda doi: RECORDS[doi])
+    start = Paper('S', ['Start'], None, 1999, [{'DOI': 'A'}])
+    restored = Paper(**RECORDS['A'])
+    frontier = FrontierScheduler(KEYWORDS, [], cache, Random(0), score_thresholds=(1, 20, 40))
+    frontier.add_paper(start, 0, queue_seen=False)
+    frontier.add_paper(restored, 1, queue_seen=False)
+    steps = []
+    while (step := frontier.next_step()):
+        parent, wrapper = step
+        steps.append((parent.get_DOI(), wrapper.get_paper().get_DOI(), type(wrapper.get_action())))
+    assert steps == [('A', 'X', NewPaper)]
+
+class SequenceRandom():
+    def __init__(self, values):
+        self._values = list(values)
+
+    def random(self):
+        return self._values.pop(0)
+
+def test_back_to_start_falls_back_to_frontier():
+    cache = MetadataCache(fetch_record=lambda doi: RECORDS[doi])
+    start = Paper('S', ['Start'], None, 1999, [{'DOI': 'A'}])
+    # A is taken from the whole frontier, then going back to start finds no starting references left
+    frontier = FrontierScheduler(KEYWORDS, [], cache, SequenceRandom([1.0, 0.0, 0.0]), score_thresholds=(1, 20, 40))
+    frontier.add_paper(start, 0)
+    dois = []
+    while (step := frontier.next_step()):
+        dois.append(step[1].get_paper().get_DOI())
+    assert dois == ['A', 'X']
+
+def test_cached_entries_resolve_after_budget_is_spent():
+    fetched = []
+    def fetch_record(doi):
+        fetched.append(doi)
+        return RECORDS[doi]
+    cache = MetadataCache(fetch_record=fetch_record)
+    cache.get_paper('X')
+    cache.start_run(1)
+    start = Paper('S', ['Start'], None, 1999, [{'DOI': 'A'}, {'DOI': 'B'}, {'DOI': 'X'}])
+    frontier = FrontierScheduler(KEYWORDS, [], cache, Random(0), score_thresholds=(1, 20, 40))
+    frontier.add_paper(start, 0)
+    dois = []
+    while (step := frontier.next_step()):
+        dois.append(step[1].get_paper().get_DOI())
+    # A spends the budget and B is refused, but X still comes from the cache
+    assert fetched == ['X', 'A']
+    assert set(dois) == {'A', 'X'}
+    assert cache.was_fetch_refused()
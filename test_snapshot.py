@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Filename: 	test_snapshot.py
+# Author: 	Alessandro Gerada, Nada Reza
+# Date: 	2023-04-25
+# Copyright: 	Alessandro Gerada 2023
+# Email: 	alessandro.gerada@liverpool.ac.uk
+
+"""Round-trip tests for the snapshot format"""
+
+import pytest
+from Paper import Paper
+from Snapshot import Snapshot, write_snapshot, make_dag_from_snapshot, DEFAULT_COLOUR
+
+KEYWORDS = [['pharmacokinetic', '3'], ['mic', '2']]
+IMPORTANT_AUTHORS = ['roberts']
+
+@pytest.fixture
+def papers():
+    start = Paper('10.1/a', ['Pharmacokinetic review'], [{'family': 'Roberts'}, {'family': 'Lipman'}], 2020,
+                  [{'DOI': '10.1/b', 'article-title': 'MIC stuff'},
+                   {'article-title': 'No DOI here'},
+                   {'DOI': '10.1/c', 'year': '2001'},
+                   {'DOI': '10.1/b', 'article-title': 'MIC stuff again'},
+                   {}])
+    seen = Paper('10.1/b', ['MIC stuff'], [{'family': 'Smith'}], 2019, [{'DOI': '10.1/a'}])
+    return start, seen
+
+def write(path, papers):
+    start, seen = papers
+    write_snapshot(path, [start, seen], KEYWORDS, IMPORTANT_AUTHORS,
+                   starting_papers=[start],
+                   paper_counter={seen: 4},
+                   depth_list={start.make_name(): 0, seen.make_name(): 1},
+                   walk_edges=[(seen.make_name(), start.make_name())],
+                   colours={start.make_name(): '#FF0000'})
+
+def test_round_trip(tmp_path, papers):
+    start, seen = papers
+    path = tmp_path / 'snapshot.rss'
+    write(path, papers)
+    with Snapshot(path) as snapshot:
+        [loaded_start] = snapshot.get_starting_papers()
+        [loaded_seen] = snapshot.get_seen_papers()
+        assert loaded_start == start and loaded_seen == seen
+        assert loaded_start.make_name() == start.make_name()
+        assert loaded_start.score_paper(KEYWORDS, IMPORTANT_AUTHORS) == start.score_paper(KEYWORDS, IMPORTANT_AUTHORS)
+        assert loaded_seen.get_visits() == 4
+        assert loaded_seen.get_depth() == 1
+        assert list(snapshot.get_walk_parent_ids(loaded_seen.get_index())) == [loaded_start.get_index()]
+
+def test_dag_from_snapshot(tmp_path, papers):
+    start, seen = papers
+    path = tmp_path / 'snapshot.rss'
+    write(path, papers)
+    with Snapshot(path) as snapshot:
+        DAG = make_dag_from_snapshot(snapshot)
+    assert set(DAG.nodes) == {start.make_name(), seen.make_name()}
+    assert list(DAG.edges()) == [(seen.make_name(), start.make_name())]
+    assert DAG.nodes[start.make_name()]['color'] == '#FF0000'
+    assert DAG.nodes[seen.make_name()]['color'] == DEFAULT_COLOUR
+    assert DAG.nodes[seen.make_name()]['size'] == 4 + 1 * 3
+    assert DAG.nodes[start.make_name()]['line_width'] == 7
+
+def test_reference_lists_match(tmp_path, papers):
+    start, _ = papers
+    path = tmp_path / 'snapshot.rss'
+    write(path, papers)
+    with Snapshot(path) as snapshot:
+        [loaded_start] = snapshot.get_starting_papers()
+        for loaded in (loaded_start, loaded_start.to_paper()):
+            references = loaded.get_references()
+            assert len(references) == len(start.get_references())
+            assert [r.get_DOI() for r in references] == [r.get_DOI() for r in start.get_references()]
+            assert [r.get_title() for r in references] == [r.get_title() for r in start.get_references()]
+
+def test_find_DOI(tmp_path, papers):
+    path = tmp_path / 'snapshot.rss'
+    write(path, papers)
+    with Snapshot(path) as snapshot:
+        # the resolved paper is preferred over the stubs that share its DOI
+        row = snapshot.find_DOI('10.1/b')
+        assert snapshot.is_resolved(row) and snapshot.get_title(row) == 'MIC stuff'
+        row = snapshot.find_DOI('10.1/c')
+        assert not snapshot.is_resolved(row) and snapshot.get_year(row) == 2001
+        assert snapshot.find_DOI('10.1/missing') is None
+        assert snapshot.find_DOI(None) is None
+
+def test_empty_snapshot(tmp_path):
+    path = tmp_path / 'empty.rss'
+    write_snapshot(path, [], KEYWORDS, IMPORTANT_AUTHORS)
+    with Snapshot(path) as snapshot:
+        assert len(snapshot) == 0
+        assert snapshot.get_starting_papers() == []
+        assert snapshot.find_DOI('10.1/a') is None
+
+def test_close_with_arrays_held(tmp_path, papers):
+    path = tmp_path / 'snapshot.rss'
+    write(path, papers)
+    snapshot = Snapshot(path)
+    held = snapshot.get_array('year')
+    snapshot.close()
+    assert list(held)[:2] == [2020, 2019]
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'not_a_snapshot.rss'
+    path.write_bytes(b'hello world, this is not a snapshot')
+    with pytest.raises(ValueError):
+        Snapshot(path)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Filename: 	test_trace.py
+# Author: 	Alessandro Gerada, Nada Reza
+# Date: 	2023-04-25
+# Copyright: 	Alessandro Gerada 2023
+# Email: 	alessandro.gerada@liverpool.ac.uk
+
+"""Round-trip and replay tests for walk traces"""
+
+from random import Random
+import json
+import pytest
+from Paper import Paper
+from Cache import MetadataCache
+from Scheduler import FrontierScheduler
+from Surf import SurfWrapper, NewPaper, LowScorePaper, BackToStart, sort_papers, surf
+from Trace import TraceWriter, TraceStep, read_trace, file_identity, check_replay_input
+
+KEYWORDS = [['pharmacokinetic', '3'], ['pharmacodynamic', '3']]
+IMPORTANT_AUTHORS = ['roberts']
+RECORDS = {
+    'a': dict(DOI='a', title=['Pharmacokinetic review'], author=[{'family': 'Roberts'}], year=2000,
+              references=[{'DOI': 'b', 'article-title': 'pharmacokinetic x'}, {'DOI': 'c'}, {'DOI': 'missing'}]),
+    'b': dict(DOI='b', title=['Pharmacokinetic pharmacodynamic'], author=None, year=2001,
+              references=[{'DOI': 'd'}, {'DOI': 'a'}]),
+    'c': dict(DOI='c', title=['Cats'], author=None, year=2002, references=[{'DOI': 'e'}]),
+    'd': dict(DOI='d', title=['Pharmacodynamic'], author=None, year=2003, references=None),
+}
+
+def fetch_record(doi):
+    return RECORDS[doi]
+
+def test_round_trip(tmp_path):
+    paper = Paper('10.1/a', ['t'], None, 2020)
+    jumped_to = Paper('10.1/z', ['z'], None, 2021)
+    steps = [TraceStep.from_wrapper(SurfWrapper(paper, NewPaper(), reference_index=3, fetched_DOI='10.1/A')),
+             TraceStep.from_wrapper(SurfWrapper(jumped_to, LowScorePaper(), reference_index=1, fetched_DOI='10.1/low')),
+             TraceStep.from_wrapper(SurfWrapper(paper, BackToStart()))]
+    path = tmp_path / 'trace.rst'
+    with TraceWriter(path, 2**62 + 5, profile='default') as trace:
+        for step in steps:
+            trace.write_step(step)
+        trace.update_header(scheduler=False)
+    seed, header, loaded = read_trace(path)
+    assert seed == 2**62 + 5
+    assert header == {'profile': 'default', 'scheduler': False}
+    assert loaded == steps
+    assert loaded[1].get_DOI() == '10.1/z' and loaded[1].get_fetched_DOI() == '10.1/low'
+    assert loaded[2].get_reference_index() == -1 and loaded[2].get_fetched_DOI() is None
+
+def test_seed_must_fit(tmp_path):
+    for seed in (-1, 2**64):
+        with pytest.raises(ValueError):
+            TraceWriter(tmp_path / 'trace.rst', seed)
+
+def test_replay_input_must_match(tmp_path):
+    path = tmp_path / 'snapshot.rss'
+    path.write_bytes(b'first')
+    recorded = file_identity(path)
+    assert check_replay_input(recorded, None, 'snapshot') == str(path)
+    path.write_bytes(b'second')
+    with pytest.raises(ValueError):
+        check_replay_input(recorded, None, 'snapshot')
+    assert check_replay_input(None, None, 'snapshot') is None
+
+def run(cache, seed, trace=None):
+    start = Paper('s', ['Start'], None, 1999, [{'DOI': 'a'}, {'DOI': 'c'}])
+    frontier = FrontierScheduler(KEYWORDS, IMPORTANT_AUTHORS, cache, Random(seed), score_thresholds=(5, 20, 40))
+    frontier.add_paper(start, 0)
+    steps = []
+    while (step := frontier.next_step()):
+        steps.append(TraceStep.from_wrapper(step[1]))
+        if trace:
+            trace.write_step(steps[-1])
+    return steps
+
+def record(walk, cache_path, trace_path, seed):
+    cache = MetadataCache(cache_path, fetch_record=fetch_record)
+    with TraceWriter(trace_path, seed) as trace:
+        recorded = walk(cache, seed, trace)
+        cache.save()
+        trace.update_header(metadata_cache=dict(path=str(cache_path), records=cache.get_run_records()))
+    return recorded
+
+def replay(walk, trace_path):
+    seed, header, steps = read_trace(trace_path)
+    cache = MetadataCache(header['metadata_cache']['path'])
+    cache.pin_records(header['metadata_cache']['records'])
+    assert cache.is_offline()
+    return walk(cache, seed), steps
+
+def test_seeded_record_then_replay(tmp_path):
+    cache_path = tmp_path / 'metadata_cache.json'
+    trace_path = tmp_path / 'trace.rst'
+    recorded = record(run, cache_path, trace_path, 1234)
+    assert recorded
+    replayed, steps = replay(run, trace_path)
+    assert replayed == steps == recorded
+
+def walk(cache, seed, trace=None, iterations=20):
+    rng = Random(seed)
+    start = Paper('s', ['Start'], None, 1999, [{'DOI': 'a'}, {'article-title': 'No DOI'}, {'DOI': 'c'}, {'DOI': 'missing'}])
+    other = Paper('t', ['Other start'], None, 1998, [{'DOI': 'b'}, {'DOI': 'c'}])
+    starting_papers = {start, other}
+    seen_DOIs = set()
+    seen_papers = set()
+    back_to_start_weight = 0.15
+    pointer = rng.choice(sort_papers(starting_papers))
+    steps = []
+    for _ in range(iterations):
+        wrapper = surf(pointer, starting_papers, seen_DOIs, seen_papers, KEYWORDS, IMPORTANT_AUTHORS, None, cache,
+                       back_to_start_weight=back_to_start_weight, rng=rng, score_thresholds=(5, 20, 40))
+        if wrapper.get_back_to_start_weight() is not None:
+            back_to_start_weight = wrapper.get_back_to_start_weight()
+        steps.append(TraceStep.from_wrapper(wrapper))
+        if trace:
+            trace.write_step(steps[-1])
+        paper = wrapper.get_paper()
+        if paper not in starting_papers and paper not in seen_papers:
+            seen_DOIs.add(paper.get_DOI())
+            seen_papers.add(paper)
+        if paper.get_references():
+            pointer = paper
+        else:
+            pointer = rng.choice(sort_papers(seen_papers or starting_papers))
+    return steps
+
+def test_seeded_walk_record_then_replay(tmp_path):
+    cache_path = tmp_path / 'metadata_cache.json'
+    trace_path = tmp_path / 'trace.rst'
+    recorded = record(walk, cache_path, trace_path, 7)
+    assert recorded == walk(MetadataCache(fetch_record=fetch_record), 7)
+    actions = {step.get_action() for step in recorded}
+    assert NewPaper in actions and LowScorePaper in actions
+    # the rejected paper is recorded, not the one the walk jumped to
+    assert all(step.get_fetched_DOI() == 'c' for step in recorded if step.get_action() is LowScorePaper)
+
+    # a later run adding records to the cache does not stop the trace replaying
+    records = json.loads(cache_path.read_text())
+    records['later'] = dict(DOI='later', title=['Later'], author=None, year=2020, references=None)
+    cache_path.write_text(json.dumps(records))
+    replayed, steps = replay(walk, trace_path)
+    assert replayed == steps == recorded
+
+    # but changing a record the walk read does
+    records['a']['title'] = ['Changed']
+    cache_path.write_text(json.dumps(records))
+    with pytest.raises(ValueError):
+        replay(walk, trace_path)